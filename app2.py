@@ -1,68 +1,331 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import streamlit as st
 import requests
+import aiohttp
+import diskcache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import plotly.graph_objects as go
-import pandas as pd
-import json
-from datetime import datetime, timedelta
+import numpy as np
+import re
+import orjson
+from datetime import datetime, timedelta, timezone
 from google import genai
 from google.genai import types
 
+# Currencies offered in the app
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CNY", "INR", "AUD", "CAD", "CHF", "SGD"]
+
+# Lowercase codes as used in the currency API's URLs and JSON keys
+_LC = {code: code.lower() for code in CURRENCIES}
+
+# `"code": rate` pairs for the app currencies inside a raw rates document
+_RATE_RE = re.compile(rb'"(' + b'|'.join(lc.encode() for lc in _LC.values()) + rb')"\s*:\s*([0-9.eE+-]+)')
+
+# (connect, read) timeouts so a slow mirror can't hang a rerun
+REQUEST_TIMEOUT = (2, 5)
+
+# How long the primary mirror gets before the fallback is raced against it
+HEDGE_DELAY = 0.4
+
+
+# Shared HTTP session so connections to the rate mirrors are reused across calls. Streamlit
+# re-executes this script on every rerun, so it lives in cache_resource (one per process)
+@st.cache_resource
+def _http_session():
+    session = requests.Session()
+    session.headers.update({"Connection": "keep-alive"})
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=64,
+        # raise_on_status=False hands back the last 5xx so the fallback mirror still gets tried
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504], raise_on_status=False),
+    ))
+    return session
+
+
+# On-disk store of archive rates, keyed by (from, to) -> {date: rate}.
+# Past days never change, so entries are kept without expiry. Opened once per
+# process (cache_resource) rather than on every rerun of this script
+@st.cache_resource
+def _rate_cache():
+    return diskcache.Cache(os.path.expanduser("~/.cache/currency"))
+
+
+# Worker threads for hedged requests made through the shared session, one pool per
+# process (cache_resource) for all user sessions. A losing request keeps its worker until
+# it finishes or times out, so leave headroom for several sessions hedging at once
+# (requests.Session is safe to share for plain GETs)
+@st.cache_resource
+def _executor():
+    return ThreadPoolExecutor(max_workers=16)
+
+
+# Fetch the primary URL; if it hasn't answered after HEDGE_DELAY (or failed), race the fallback
+def _hedged_get(primary_url, fallback_url):
+    session, executor = _http_session(), _executor()
+    primary = executor.submit(session.get, primary_url, timeout=REQUEST_TIMEOUT)
+    done, _ = wait([primary], timeout=HEDGE_DELAY)
+    if primary in done and not primary.exception() and primary.result().status_code == 200:
+        return primary.result()
+
+    pending = {executor.submit(session.get, fallback_url, timeout=REQUEST_TIMEOUT)}
+    if primary not in done:
+        pending.add(primary)
+
+    # First 200 wins; otherwise hand back the last response (or error) we saw
+    response, error = None, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception():
+                error = future.exception()
+                continue
+            response = future.result()
+            if response.status_code == 200:
+                return response
+
+    if response is None:
+        raise error
+    return response
+
+
+# Pull just the app currencies' rates (lowercase code -> rate) out of a raw rates document
+# without decoding the other ~200 entries; fall back to a full parse if the regex finds nothing
+def _extract_rates(raw, fc):
+    rates = {m.group(1).decode(): float(m.group(2)) for m in _RATE_RE.finditer(raw)}
+    if not rates:
+        data = orjson.loads(raw)[fc]
+        rates = {lc: data[lc] for lc in _LC.values() if lc in data}
+    return rates
+
+
+# Fetch the latest rate and when it was fetched (cached for an hour). Failures raise,
+# so st.cache_data never memoizes them for everyone; get_exchange_rate reports them
+@st.cache_data(ttl=3600)
+def _fetch_exchange_rate(from_currency, to_currency):
+    fc, tc = _LC[from_currency], _LC[to_currency]
 
-# Function to fetch exchange rate data from free API
-def get_exchange_rate(from_currency, to_currency):
     # Primary URL
-    primary_url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/{from_currency.lower()}.json"
+    primary_url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/{fc}.min.json"
     # Fallback URL
-    fallback_url = f"https://latest.currency-api.pages.dev/v1/currencies/{from_currency.lower()}.json"
+    fallback_url = f"https://latest.currency-api.pages.dev/v1/currencies/{fc}.min.json"
 
-    try:
-        response = requests.get(primary_url)
-        if response.status_code != 200:
-            response = requests.get(fallback_url)
+    response = _hedged_get(primary_url, fallback_url)
+    # Both mirrors failed: report the HTTP error rather than trying to parse an error page
+    if response.status_code != 200:
+        raise requests.HTTPError(f"HTTP {response.status_code} from {response.url}", response=response)
+    return _extract_rates(response.content, fc)[tc], datetime.now(timezone.utc)
 
-        data = response.json()
-        current_rate = data[from_currency.lower()][to_currency.lower()]
-        return current_rate
+
+# Function to fetch exchange rate data from free API: (rate, fetched_at), or (None, None)
+def get_exchange_rate(from_currency, to_currency):
+    try:
+        return _fetch_exchange_rate(from_currency, to_currency)
     except Exception as e:
         st.error(f"Failed to fetch exchange rate: {e}")
-        return None
+        return None, None
 
 
-# Function to get historical data for chart (last 30 days for better visualization)
-def get_historical_rates(from_currency, to_currency, days=7):
-    rates = []
-    dates = []
+# Fetch one raw document, or None if the mirror doesn't have it
+async def _get_bytes(session, url):
+    async with session.get(url) as response:
+        if response.status != 200:
+            return None
+        return await response.read()
 
-    for i in range(days, 0, -1):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-        url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@{date}/v1/currencies/{from_currency.lower()}.json"
-        fallback_url = f"https://{date}.currency-api.pages.dev/v1/currencies/{from_currency.lower()}.json"
 
-        try:
-            response = requests.get(url)
-            if response.status_code != 200:
-                response = requests.get(fallback_url)
+# Async counterpart of _hedged_get: race the fallback once the primary is slow or failed
+async def _hedged_get_bytes(session, primary_url, fallback_url):
+    primary = asyncio.ensure_future(_get_bytes(session, primary_url))
+    done, _ = await asyncio.wait({primary}, timeout=HEDGE_DELAY)
+    if primary in done and not primary.exception() and primary.result() is not None:
+        return primary.result()
 
-            if response.status_code == 200:
-                data = response.json()
-                rate = data[from_currency.lower()][to_currency.lower()]
-                rates.append(rate)
-                dates.append(date)
-        except:
-            # Skip if data for this date is not available
-            continue
+    pending = {asyncio.ensure_future(_get_bytes(session, fallback_url))}
+    if primary not in done:
+        pending.add(primary)
 
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.exception() and task.result() is not None:
+                    return task.result()
+        return None
+    finally:
+        # Cancel the loser; its `async with` releases the connection back to the pool
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Function to fetch a single day's rates from the archive, for every app currency
+async def _fetch_day(session, date, from_currency):
+    fc = _LC[from_currency]
+    url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@{date}/v1/currencies/{fc}.min.json"
+    fallback_url = f"https://{date}.currency-api.pages.dev/v1/currencies/{fc}.min.json"
+
+    raw = await _hedged_get_bytes(session, url, fallback_url)
+    if raw is None:
+        return date, None
+
+    # The document lists ~200 currencies; only keep the ones the app offers
+    rates = _extract_rates(raw, fc)
+    return date, {code: rates[lc] for code, lc in _LC.items() if lc in rates}
+
+
+# Pooled aiohttp session for one batch of rate requests
+def _client_session():
+    connector = aiohttp.TCPConnector(limit=32, limit_per_host=16)
+    timeout = aiohttp.ClientTimeout(sock_connect=REQUEST_TIMEOUT[0], sock_read=REQUEST_TIMEOUT[1])
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+# Fire all day requests to the archive concurrently over one pooled session
+async def _fetch_days(dates, from_currency):
+    async with _client_session() as session:
+        tasks = [_fetch_day(session, date, from_currency) for date in dates]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Skip dates that failed or are not available in the archive yet
+    return dict(r for r in results if not isinstance(r, BaseException) and r[1])
+
+
+# Fetch a whole date range in one request from the Frankfurter (ECB) timeseries API,
+# as {date: rate}; ECB only publishes business days
+async def _fetch_range(start, end, from_currency, to_currency):
+    url = f"https://api.frankfurter.app/{start}..{end}?from={from_currency}&to={to_currency}"
+    async with _client_session() as session:
+        raw = await _get_bytes(session, url)
+    if raw is None:
+        return {}
+    series = orjson.loads(raw).get("rates", {})
+    return {date: rates[to_currency] for date, rates in series.items() if to_currency in rates}
+
+
+# Raised by the history loaders when some days are still unavailable, so the partial
+# window is returned to the caller without being memoized by st.cache_data
+class _IncompleteHistory(Exception):
+    def __init__(self, dates, rates):
+        super().__init__(f"{len(dates)} days available")
+        self.dates = dates
+        self.rates = rates
+
+
+# In-memory cache serves reruns; the disk cache means only new days hit the network.
+# The archive is indexed by UTC date, and passing `today` makes it part of the cache key
+@st.cache_data(ttl=86400)
+def _load_history(from_currency, to_currency, days, today):
+    wanted_dates = [(today - timedelta(days=i)).isoformat() for i in range(days, 0, -1)]
+
+    store = _rate_cache()
+    cached = store.get((from_currency, to_currency), {})
+    missing = [date for date in wanted_dates if date not in cached]
+
+    if missing:
+        fetched = asyncio.run(_fetch_days(missing, from_currency))
+
+        # Store every target currency seen, so switching the target later costs no network
+        with store.transact():
+            for code in CURRENCIES:
+                day_rates = {date: rates[code] for date, rates in fetched.items() if code in rates}
+                if not day_rates:
+                    continue
+                stored = store.get((from_currency, code), {})
+                stored.update(day_rates)
+                store.set((from_currency, code), stored)
+
+        cached.update({date: rates[to_currency] for date, rates in fetched.items() if to_currency in rates})
+
+    dates = [date for date in wanted_dates if date in cached]
+    rates = [cached[date] for date in dates]
+
+    if len(dates) < len(wanted_dates):
+        raise _IncompleteHistory(dates, rates)
     return dates, rates
 
 
-# Function to query for news articles using Google Search via Gemini
-def query_for_news(from_currency, to_currency):
-    # Configure client
-    client = genai.Client(
-        api_key=st.secrets["API_KEY"]  # In production, use environment variables
-    )
+# ECB reference rates for the window in a single request, used only when the archive has
+# nothing for it. Kept apart from the archive data (no disk cache), and never mixed into
+# one series: the two sources differ by about as much as a daily move
+@st.cache_data(ttl=86400)
+def _load_ecb_history(from_currency, to_currency, days, today):
+    if from_currency == to_currency:
+        raise _IncompleteHistory([], [])
+
+    start = (today - timedelta(days=days)).isoformat()
+    end = (today - timedelta(days=1)).isoformat()
+    series = asyncio.run(_fetch_range(start, end, from_currency, to_currency))
 
-    model = "gemini-2.0-flash"
+    # Frankfurter may widen the start back to the previous business day
+    dates = sorted(date for date in series if start <= date <= end)
+    rates = [series[date] for date in dates]
+
+    if not dates:
+        raise _IncompleteHistory(dates, rates)
+    return dates, rates
+
+
+# Function to get historical data for chart (last 30 days for better visualization),
+# as (dates, rates, source). The series comes from the same archive as the current rate;
+# only if the archive has nothing for the window does it fall back to ECB rates.
+# A partial window is still shown, but only a complete one is cached. `today` is
+# resolved here, outside the cache, so the cache key always carries the UTC date
+def get_historical_rates(from_currency, to_currency, days=7, today=None):
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+
+    try:
+        return (*_load_history(from_currency, to_currency, days, today), "archive")
+    except _IncompleteHistory as e:
+        if e.dates:
+            return e.dates, e.rates, "archive"
+
+    try:
+        return (*_load_ecb_history(from_currency, to_currency, days, today), "ecb")
+    except Exception:
+        return [], [], None
+
+
+# Fenced ```json block in the Gemini response
+_JSON_BLOCK = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL)
+
+# Gemini model and request config are static, so keep them out of query_for_news
+# (the script still rebuilds them on each Streamlit rerun)
+GEMINI_MODEL = "gemini-2.0-flash"
+
+_NEWS_TOOLS = [
+    types.Tool(
+        google_search=types.GoogleSearch()
+    ),
+]
+
+_NEWS_CONFIG = types.GenerateContentConfig(
+    thinking_config=types.ThinkingConfig(thinking_budget=0),
+    tools=_NEWS_TOOLS,
+    response_mime_type="text/plain",
+)
+
+
+# One Gemini client per server process (cache_resource: the client is not picklable).
+# The API key is looked up here, so only once per process: environment first, then
+# Streamlit secrets
+@st.cache_resource
+def _gemini_client():
+    try:
+        api_key = os.environ.get("API_KEY") or st.secrets["API_KEY"]
+    except (KeyError, FileNotFoundError):
+        api_key = None
+    return genai.Client(api_key=api_key)
+
+
+# Ask Gemini for news articles (cached for 30 min). Errors raise instead of returning []
+# so they aren't memoized; query_for_news reports them
+@st.cache_data(ttl=1800)
+def _fetch_news(from_currency, to_currency):
     user_query = f"""
     Search for 4 recent news articles about {from_currency} and {to_currency} exchange rates or economic factors affecting these currencies.
 
@@ -90,69 +353,130 @@ def query_for_news(from_currency, to_currency):
         ),
     ]
 
-    tools = [
-        types.Tool(
-            google_search=types.GoogleSearch()
-        ),
-    ]
+    client = _gemini_client()
 
-    generate_content_config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(thinking_budget=0),
-        tools=tools,
-        response_mime_type="text/plain",
+    # Only the complete JSON is used, so there's no point streaming chunks
+    response = client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=contents,
+        config=_NEWS_CONFIG,
     )
+    result = response.text or ""
+
+    # Extract JSON from the response, or try parsing the whole thing as JSON
+    match = _JSON_BLOCK.search(result)
+    payload = match.group(1) if match else result
+    return orjson.loads(payload)
+
 
+# Function to query for news articles using Google Search via Gemini
+def query_for_news(from_currency, to_currency):
     try:
-        result = ""
-        for chunk in client.models.generate_content_stream(
-                model=model,
-                contents=contents,
-                config=generate_content_config,
-        ):
-            result += chunk.text
-
-        # Extract JSON from the response
-        json_start = result.find("```json")
-        json_end = result.rfind("```")
-
-        if json_start != -1 and json_end != -1:
-            json_text = result[json_start + 7:json_end].strip()
-            news_articles = json.loads(json_text)
-            return news_articles
-        else:
-            try:
-                # Try parsing the whole thing as JSON
-                return json.loads(result)
-            except:
-                st.error("Failed to parse news response")
-                return []
+        return _fetch_news(from_currency, to_currency)
+    except orjson.JSONDecodeError:
+        st.error("Failed to parse news response")
+        return []
     except Exception as e:
         st.error(f"Error fetching news: {e}")
         return []
 
 
-# Create enhanced chart with Plotly
-# Create enhanced chart with Plotly
-def create_currency_chart(dates, rates, from_currency, to_currency):
-    # Create DataFrame
-    df = pd.DataFrame({
-        'date': pd.to_datetime(dates),
-        'rate': rates
-    })
+# Static chart styling shared by every render; _style_fig only fills in the per-pair fields.
+# Streamlit re-executes this script on each rerun, so the dict is still rebuilt per run;
+# what it saves is rebuilding and re-validating it inside every chart render
+_BASE_LAYOUT = dict(
+    title_font=dict(size=22, color='white'),
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1
+    ),
+    plot_bgcolor='rgba(17, 25, 40, 0.6)',
+    paper_bgcolor='rgba(17, 25, 40, 0)',
+    hovermode='x unified',
+    margin=dict(l=20, r=20, t=60, b=20),
+    height=460,
+    yaxis=dict(
+        title=dict(font=dict(size=14)),
+        showgrid=True,
+        gridcolor='rgba(255, 255, 255, 0.1)'
+    ),
+    yaxis2=dict(
+        title=dict(
+            text='Percent Change (%)',
+            font=dict(size=14, color='rgba(255, 209, 102, 0.8)')
+        ),
+        anchor='x',
+        overlaying='y',
+        side='right',
+        showgrid=False,
+        zeroline=True,
+        zerolinecolor='rgba(255, 255, 255, 0.3)',
+        tickfont=dict(color='rgba(255, 209, 102, 0.8)')
+    ),
+    xaxis=dict(
+        showgrid=True,
+        gridcolor='rgba(255, 255, 255, 0.1)',
+        tickformat='%b %d',
+        # Range selector
+        rangeslider=dict(visible=False),
+        rangeselector=dict(
+            buttons=[
+                dict(count=7, label="7d", step="day", stepmode="backward"),
+                dict(count=14, label="14d", step="day", stepmode="backward"),
+                dict(step="all", label="All")
+            ],
+            font=dict(color='white'),
+            bgcolor='rgba(74, 144, 226, 0.4)',
+            activecolor='rgba(74, 144, 226, 0.8)'
+        )
+    ),
+    font=dict(color='white'),
+    # Animated transitions
+    transition_duration=500
+)
+
+
+# Build the chart series once; only the styling below re-runs
+@st.cache_data(ttl=86400)
+def _build_series(dates, rates):
+    dates_arr = np.array(dates, dtype='datetime64[D]')
+    rates_arr = np.asarray(rates, dtype=np.float64)
 
     # Calculate percentage change from first day
-    first_rate = df['rate'].iloc[0]
-    df['percent_change'] = ((df['rate'] - first_rate) / first_rate) * 100
+    pct = (rates_arr - rates_arr[0]) / rates_arr[0] * 100.0
+
+    return dates_arr, rates_arr, pct
+
+
+# Lay out the masked day-over-day moves as (date, previous rate) -> (date, rate) segments,
+# each followed by a NaN so Plotly breaks the line between them
+def _segments(dates_arr, rates_arr, mask):
+    xs = np.repeat(dates_arr[1:][mask], 3)
+    ys = np.column_stack((
+        rates_arr[:-1][mask],
+        rates_arr[1:][mask],
+        np.full(np.count_nonzero(mask), np.nan),
+    )).ravel()
+    return xs, ys
+
 
+# Style the Plotly figure for a prepared series
+def _style_fig(dates_arr, rates_arr, pct, from_currency, to_currency):
     # Create a figure with secondary y-axis
     fig = go.Figure()
 
-    # Add candlestick-like visualization to highlight daily changes
-    for i in range(1, len(df)):
-        color = 'rgba(0, 255, 213, 0.7)' if df['rate'].iloc[i] >= df['rate'].iloc[i - 1] else 'rgba(255, 107, 129, 0.7)'
-        fig.add_trace(go.Scatter(
-            x=[df['date'].iloc[i], df['date'].iloc[i]],
-            y=[df['rate'].iloc[i - 1], df['rate'].iloc[i]],
+    # Add candlestick-like visualization to highlight daily changes. Up and down days
+    # each go into a single trace, with NaN gaps separating the per-day segments
+    up_mask = np.diff(rates_arr) >= 0
+    for mask, color in ((up_mask, 'rgba(0, 255, 213, 0.7)'),
+                        (~up_mask, 'rgba(255, 107, 129, 0.7)')):
+        xs, ys = _segments(dates_arr, rates_arr, mask)
+        fig.add_trace(go.Scattergl(
+            x=xs,
+            y=ys,
             mode='lines',
             line=dict(color=color, width=8),
             showlegend=False
@@ -160,8 +484,8 @@ def create_currency_chart(dates, rates, from_currency, to_currency):
 
     # Add line trace for overall trend
     fig.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['rate'],
+        x=dates_arr,
+        y=rates_arr,
         mode='lines+markers',
         name=f'Exchange Rate',
         line=dict(color='rgba(74, 144, 226, 0.8)', width=2, shape='spline'),
@@ -171,8 +495,8 @@ def create_currency_chart(dates, rates, from_currency, to_currency):
 
     # Add percentage change trace on secondary y-axis
     fig.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['percent_change'],
+        x=dates_arr,
+        y=pct,
         mode='lines',
         name='% Change',
         line=dict(color='rgba(255, 209, 102, 0.8)', width=1, dash='dot'),
@@ -181,93 +505,44 @@ def create_currency_chart(dates, rates, from_currency, to_currency):
     ))
 
     # Calculate appropriate y-axis range to focus on changes
-    min_rate = df['rate'].min() * 0.998  # Slightly below minimum
-    max_rate = df['rate'].max() * 1.002  # Slightly above maximum
+    min_rate = rates_arr.min() * 0.998  # Slightly below minimum
+    max_rate = rates_arr.max() * 1.002  # Slightly above maximum
 
-    # Update layout with modern styling
+    # Update layout with modern styling: static parts first, then the per-pair fields
+    fig.update_layout(**_BASE_LAYOUT)
     fig.update_layout(
-        title=f'{from_currency}/{to_currency} Exchange Rate Trend',
-        title_font=dict(size=22, color='white'),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        plot_bgcolor='rgba(17, 25, 40, 0.6)',
-        paper_bgcolor='rgba(17, 25, 40, 0)',
-        hovermode='x unified',
-        margin=dict(l=20, r=20, t=60, b=20),
-        height=460,
+        title_text=f'{from_currency}/{to_currency} Exchange Rate Trend',
         yaxis=dict(
-            title=dict(
-                text=f'{to_currency} per {from_currency}',
-                font=dict(size=14)
-            ),
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
+            title_text=f'{to_currency} per {from_currency}',
             range=[min_rate, max_rate],
             tickformat='.6f' if max_rate - min_rate < 0.1 else '.4f'
-        ),
-        yaxis2=dict(
-            title=dict(
-                text='Percent Change (%)',
-                font=dict(size=14, color='rgba(255, 209, 102, 0.8)')
-            ),
-            anchor='x',
-            overlaying='y',
-            side='right',
-            showgrid=False,
-            zeroline=True,
-            zerolinecolor='rgba(255, 255, 255, 0.3)',
-            tickfont=dict(color='rgba(255, 209, 102, 0.8)')
-        ),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            tickformat='%b %d'
-        ),
-        font=dict(color='white')
-    )
-
-    # Add range selector
-    fig.update_xaxes(
-        rangeslider_visible=False,
-        rangeselector=dict(
-            buttons=list([
-                dict(count=7, label="7d", step="day", stepmode="backward"),
-                dict(count=14, label="14d", step="day", stepmode="backward"),
-                dict(step="all", label="All")
-            ]),
-            font=dict(color='white'),
-            bgcolor='rgba(74, 144, 226, 0.4)',
-            activecolor='rgba(74, 144, 226, 0.8)'
         )
     )
 
     # Add annotations for market direction
-    overall_change = ((df['rate'].iloc[-1] - df['rate'].iloc[0]) / df['rate'].iloc[0]) * 100
+    overall_change = pct[-1]
     direction = "↑" if overall_change > 0 else "↓"
     color = "rgba(0, 255, 213, 1)" if overall_change > 0 else "rgba(255, 107, 129, 1)"
 
     fig.add_annotation(
         xref="paper", yref="paper",
         x=0.01, y=0.98,
-        text=f"{direction} {abs(overall_change):.2f}% in {len(df)} days",
+        text=f"{direction} {abs(overall_change):.2f}% in {len(rates_arr)} days",
         font=dict(size=16, color=color),
         showarrow=False
     )
 
-    # Add animated transitions
-    fig.update_layout(transition_duration=500)
-
     return fig
 
 
+# Create enhanced chart with Plotly
+def create_currency_chart(dates, rates, from_currency, to_currency):
+    dates_arr, rates_arr, pct = _build_series(dates, rates)
+    return _style_fig(dates_arr, rates_arr, pct, from_currency, to_currency)
+
+
 # Custom CSS for modern UI
-def load_css():
-    st.markdown("""
+CSS = """
     <style>
     .main {
         background-color: #0e1117;
@@ -298,7 +573,17 @@ def load_css():
         padding: 10px;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+# App header markup
+HEADER_TITLE_HTML = "<h1 style='text-align: center; font-size: 42px; background: linear-gradient(90deg, #4dd0e1, #64ffda); -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>Currency Intelligence Hub</h1>"
+HEADER_SUBTITLE_HTML = "<p style='text-align: center; font-size: 16px; color: #9e9e9e; margin-top: -15px;'>Real-time exchange rates, trends, and market insights</p>"
+
+
+# Inject the custom CSS. Streamlit drops any element a rerun doesn't emit again, so this
+# has to run every time
+def load_css():
+    st.markdown(CSS, unsafe_allow_html=True)
 
 
 # --- Streamlit App ---
@@ -313,23 +598,17 @@ def main():
     load_css()
 
     # App Header - Using Streamlit's native components
-    st.markdown(
-        "<h1 style='text-align: center; font-size: 42px; background: linear-gradient(90deg, #4dd0e1, #64ffda); -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>Currency Intelligence Hub</h1>",
-        unsafe_allow_html=True)
-    st.markdown(
-        "<p style='text-align: center; font-size: 16px; color: #9e9e9e; margin-top: -15px;'>Real-time exchange rates, trends, and market insights</p>",
-        unsafe_allow_html=True)
+    st.markdown(HEADER_TITLE_HTML, unsafe_allow_html=True)
+    st.markdown(HEADER_SUBTITLE_HTML, unsafe_allow_html=True)
 
     # Currency selection container
     st.markdown("<div class='currency-input'>", unsafe_allow_html=True)
 
-    currencies = ["USD", "EUR", "GBP", "JPY", "CNY", "INR", "AUD", "CAD", "CHF", "SGD"]
-
     # Use Streamlit columns for layout
     col1, col2, col3 = st.columns([2, 1, 2])
 
     with col1:
-        from_currency = st.selectbox("From Currency", currencies, index=0)
+        from_currency = st.selectbox("From Currency", CURRENCIES, index=0)
 
     with col2:
         st.markdown(
@@ -337,7 +616,7 @@ def main():
             unsafe_allow_html=True)
 
     with col3:
-        to_currency = st.selectbox("To Currency", currencies, index=1)
+        to_currency = st.selectbox("To Currency", CURRENCIES, index=1)
 
     search_button = st.button("Analyze Currency Pair", use_container_width=True)
     st.markdown("</div>", unsafe_allow_html=True)
@@ -349,33 +628,42 @@ def main():
         else:
             from_currency, to_currency = st.session_state['last_search']
 
+        # Rate archive dates are UTC; take the clock once per run
+        today = datetime.now(timezone.utc).date()
+
+        # Only hit the APIs on an explicit "Analyze" click (which also retries a failed
+        # lookup) or when the pair or the UTC day changes; other reruns (expanders,
+        # unrelated widgets) render straight from session state, failures included
+        pair_key = f"{from_currency}->{to_currency}@{today.isoformat()}"
+        refresh = search_button or st.session_state.get('cached_pair') != pair_key
+
         # Create two columns for layout
         left_col, right_col = st.columns([1, 1])
 
         with left_col:
             with st.spinner("Fetching exchange rate data..."):
-                # Get current exchange rate
-                current_rate = get_exchange_rate(from_currency, to_currency)
+                if refresh:
+                    # Get current exchange rate, plus historical data for 30 days for better
+                    # visualization; yesterday's rate for comparison comes out of the same batch
+                    current_rate, fetched_at = get_exchange_rate(from_currency, to_currency)
+                    st.session_state['current_rate'] = current_rate
+                    st.session_state['rate_fetched_at'] = fetched_at
+                    st.session_state['history'] = (
+                        get_historical_rates(from_currency, to_currency, days=30, today=today) if current_rate else ([], [], None)
+                    )
+
+                current_rate = st.session_state['current_rate']
 
                 if current_rate:
-                    # Get yesterday's rate for comparison
-                    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                    yesterday_url = f"https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@{yesterday}/v1/currencies/{from_currency.lower()}.json"
-                    fallback_yesterday_url = f"https://{yesterday}.currency-api.pages.dev/v1/currencies/{from_currency.lower()}.json"
-
-                    try:
-                        response = requests.get(yesterday_url)
-                        if response.status_code != 200:
-                            response = requests.get(fallback_yesterday_url)
-
-                        if response.status_code == 200:
-                            data = response.json()
-                            yesterday_rate = data[from_currency.lower()][to_currency.lower()]
-                            change = current_rate - yesterday_rate
-                            percent_change = (change / yesterday_rate) * 100
-                    except:
-                        change = 0
-                        percent_change = 0
+                    dates, rates, source = st.session_state['history']
+
+                    # Only compare against yesterday from the same archive as the current rate
+                    yesterday = (today - timedelta(days=1)).isoformat()
+                    change = None
+                    if source == "archive" and dates and dates[-1] == yesterday:
+                        yesterday_rate = rates[-1]
+                        change = current_rate - yesterday_rate
+                        percent_change = (change / yesterday_rate) * 100
 
                     # Currency card container
                     with st.container():
@@ -388,16 +676,14 @@ def main():
                             unsafe_allow_html=True)
 
                         # Daily change
-                        if 'change' in locals() and 'percent_change' in locals():
+                        if change is not None:
                             change_color = "#00e676" if change >= 0 else "#ff5252"
                             st.markdown(
                                 f"<p style='font-size: 18px; color: {change_color};'>{'+' if change >= 0 else ''}{change:.6f} ({'+' if percent_change >= 0 else ''}{percent_change:.2f}%) from yesterday</p>",
                                 unsafe_allow_html=True)
 
-                        st.caption(f"Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')} UTC")
-
-                    # Get historical data for 30 days for better visualization
-                    dates, rates = get_historical_rates(from_currency, to_currency, days=30)
+                        fetched_at = st.session_state['rate_fetched_at']
+                        st.caption(f"Last updated: {fetched_at.strftime('%Y-%m-%d %H:%M')} UTC")
 
                     if dates and rates:
                         # Create enhanced chart with Plotly
@@ -408,13 +694,21 @@ def main():
                         st.plotly_chart(fig, use_container_width=True,
                                         config={'displayModeBar': True, 'responsive': True})
                         st.markdown("</div>", unsafe_allow_html=True)
+
+                        if source == "ecb":
+                            st.caption("Rate archive unavailable: showing ECB reference rates (business days only)")
                     else:
                         st.error("Could not retrieve sufficient historical data for chart")
+                elif not refresh:
+                    # The failed lookup's own error was shown on the run that made it
+                    st.error("Could not fetch the exchange rate. Press \"Analyze Currency Pair\" to retry.")
 
         with right_col:
             with st.spinner("Fetching latest news..."):
                 # Get news articles
-                news_articles = query_for_news(from_currency, to_currency)
+                if refresh:
+                    st.session_state['news'] = query_for_news(from_currency, to_currency)
+                news_articles = st.session_state['news']
 
                 # Using Streamlit container instead of HTML div
                 with st.container():
@@ -434,6 +728,8 @@ def main():
                 else:
                     st.info("No recent news articles found for these currencies.")
 
+        st.session_state['cached_pair'] = pair_key
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file